@@ -1,19 +1,43 @@
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
 import subprocess
 import os
+import re
 import signal
+import selectors
+import shlex
+import shutil
 import sys
 import logging
+import logging.handlers
 from datetime import datetime
 
 # Configure Watchdog Logging
+class FastFormatter(logging.Formatter):
+    """Builds the guardian log line with one f-string, skipping Formatter's style dispatch"""
+    def format(self, record):
+        line = f"{self.formatTime(record)} - [GUARDIAN] - {record.levelname} - {record.getMessage()}"
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line = f"{line}\n{record.exc_text}"
+        return line
+
+formatter = FastFormatter()
+file_handler = logging.FileHandler("watchdog.log", encoding='utf-8')
+file_handler.setFormatter(formatter)
+stream_handler = logging.StreamHandler(sys.stdout)
+stream_handler.setFormatter(formatter)
+# Routine INFO lines stay in RAM; WARNING+ (or a full buffer) flushes them to disk
+log_buffer = logging.handlers.MemoryHandler(capacity=64, flushLevel=logging.WARNING, target=file_handler)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - [GUARDIAN] - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler("watchdog.log", encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
+        log_buffer,
+        stream_handler
     ]
 )
 # Force UTF-8 for stdout/stderr if possible
@@ -23,47 +47,116 @@ if sys.platform == "win32":
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 logger = logging.getLogger("Guardian")
 
-# Configuration
+def split_command(command_line):
+    """Splits a command line, keeping quoted paths with spaces and Windows backslashes intact"""
+    parts = shlex.split(command_line, posix=(sys.platform != "win32"))
+    # Non-POSIX mode leaves the surrounding quotes on each token
+    return [p[1:-1] if len(p) >= 2 and p[0] == p[-1] and p[0] in "\"'" else p for p in parts]
+
+# Configuration (override per deploy via GUARDIAN_* environment variables)
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 # Path to the Cryptum 7.1 workspace
-BOT_WORKSPACE = r"c:\cryptum7.1_bot"
+BOT_WORKSPACE = os.environ.get("GUARDIAN_BOT_WORKSPACE", r"c:\cryptum7.1_bot")
 # Command: npx tsx src/headless-bot.ts
-BOT_START_COMMAND = ["npx", "tsx", "src/headless-bot.ts"]
+BOT_START_COMMAND = split_command(os.environ.get("GUARDIAN_START_COMMAND", "npx tsx src/headless-bot.ts"))
+
+# Fallback when npx is not on the guardian's PATH (default Node.js install on Windows)
+NPX_FALLBACK = r"C:\Program Files\nodejs\npx.cmd"
 
 # Use localhost for internal monitoring
-API_URL = "http://127.0.0.1:8001/api/status"
-CHECK_INTERVAL = 60  # seconds
+API_URL = os.environ.get("GUARDIAN_API_URL", "http://127.0.0.1:8001/api/status")
+CHECK_INTERVAL = 60  # seconds (initial interval)
+MIN_CHECK_INTERVAL = 5    # seconds, used right after a failed check
+MAX_CHECK_INTERVAL = 300  # seconds, reached after a streak of healthy checks
+CHECK_BACKOFF = 1.5
 MAX_TIMEOUTS = 3     # restarts after 3 failed checks
 STALE_DATA_THRESHOLD = 600 # seconds (10 mins)
+HEALTH_TIMEOUT = (2, 10)   # (connect, read) seconds
+READY_TIMEOUT = 90         # seconds a (re)started bot gets to bring its API up
+READY_POLL_INTERVAL = 0.5  # seconds
+EARLY_DEATH_WINDOW = 60    # seconds; dying sooner than this after spawn counts as a crash loop
+MAX_RESTART_DELAY = 30     # seconds, cap of the exponential crash-loop backoff
+
+# Only two flags are read from /api/status, so skip full JSON parsing
+IS_RUNNING_PATTERN = re.compile(rb'"is_running"\s*:\s*(true|false)')
+DATA_FRESH_PATTERN = re.compile(rb'"data_fresh"\s*:\s*(true|false)')
+
+class StaleSocketRetry(Retry):
+    """Retries a request only when the bot closed the reused keep-alive socket under it"""
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        # A hung /api/status must fail after one read timeout, not two
+        if isinstance(error, ReadTimeoutError):
+            return Retry.increment(self.new(read=False), method, url, response, error, _pool, _stacktrace)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
 
-class BotGuardian:
-    def __init__(self):
+# Single keep-alive connection reused by every health check. Refused connects (bot
+# booting or down) fail at once; one read retry covers the stale keep-alive race.
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1,
+                                     max_retries=StaleSocketRetry(total=1, connect=0, read=1, status=0)))
+# urllib3 logs each retry at WARNING, which would flush the log buffer on every poll
+logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+# Spawn the bot in its own process group so it can be signalled as a whole
+if sys.platform == "win32":
+    SPAWN_KWARGS = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    SPAWN_KWARGS = {"start_new_session": True}
+
+def resolve_command(command):
+    """Resolves the executable once so the bot can be spawned without a shell"""
+    executable = shutil.which(command[0])
+    if executable is None and command[0] == "npx" and sys.platform == "win32":
+        executable = NPX_FALLBACK
+    return [executable or command[0]] + list(command[1:])
+
+class Guardian:
+    def __init__(self, api_url=API_URL, start_command=BOT_START_COMMAND, workspace=BOT_WORKSPACE):
+        self.api_url = api_url
+        self.start_command = resolve_command(start_command)
+        self.workspace = workspace
         self.process = None
         self.failed_checks = 0
-        self.last_success_time = time.time()
+        self.last_success_time = time.monotonic()
         self.is_running = True
+        self.interval = CHECK_INTERVAL
+        self.spawned_at = time.monotonic()
+        self.early_deaths = 0
+        # Linux: long-lived selector watching the bot's pidfd (see watch_process)
+        self.selector = selectors.DefaultSelector() if hasattr(os, "pidfd_open") else None
+        self.pidfd = None
 
     def start_bot(self):
         """Starts the bot process using tsx in the correct workspace"""
-        if self.process:
+        # A process that already exited needs no stop (and no 5s wait)
+        if self.process and self.process.poll() is None:
             self.stop_bot()
+        self.unwatch_process()
+        self.process = None
             
-        logger.info(f"Starting Volatile Trader Headless in: {BOT_WORKSPACE}")
+        logger.info(f"Starting Volatile Trader Headless in: {self.workspace}")
         try:
             # Capture errors to a file for debugging
-            log_path = os.path.join(BOT_WORKSPACE, "bot_error.log")
-            with open(log_path, "a") as err_log:
-                err_log.write(f"\n--- BOT STARTUP: {datetime.now()} ---\n")
-            
-            self.error_file = open(log_path, "a", buffering=1)
-            # Running with shell=True on Windows to handle npx correctly
-            self.process = subprocess.Popen(BOT_START_COMMAND, 
-                                         cwd=BOT_WORKSPACE,
-                                         stdout=self.error_file, 
-                                         stderr=self.error_file,
-                                         shell=True) 
+            log_path = os.path.join(self.workspace, "bot_error.log")
+            # Raw O_APPEND fd: the child writes straight to the file, no Python buffering
+            log_fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(log_fd, f"\n--- BOT STARTUP: {datetime.now()} ---\n".encode("utf-8"))
+                # Executable is pre-resolved, so no intermediate shell is needed
+                self.process = subprocess.Popen(self.start_command, 
+                                             cwd=self.workspace,
+                                             stdin=subprocess.DEVNULL,
+                                             stdout=log_fd, 
+                                             stderr=log_fd,
+                                             **SPAWN_KWARGS)
+            finally:
+                # The child holds its own duplicate of the fd
+                os.close(log_fd)
+            self.watch_process()
+            self.spawned_at = time.monotonic()
             self.failed_checks = 0
-            self.last_success_time = time.time()
+            self.interval = CHECK_INTERVAL
+            self.last_success_time = time.monotonic()
             logger.info("Bot process spawned via tsx (Errors directed to bot_error.log).")
         except Exception as e:
             logger.error(f"Failed to start bot: {e}")
@@ -73,35 +166,78 @@ class BotGuardian:
         if self.process:
             logger.warning("Stopping bot process...")
             try:
-                # Terminate process tree on Windows
+                # Ask the bot's process group to shut down gracefully first
                 if sys.platform == "win32":
-                    subprocess.run(["taskkill", "/F", "/T", "/PID", str(self.process.pid)], capture_output=True)
+                    os.kill(self.process.pid, signal.CTRL_BREAK_EVENT)
                 else:
-                    os.kill(self.process.pid, signal.SIGTERM)
+                    os.killpg(self.process.pid, signal.SIGTERM)
                 self.process.wait(timeout=5)
-            except:
-                try:
-                    self.process.kill()
-                except:
-                    pass
+            except (OSError, subprocess.TimeoutExpired):
+                self.kill_process_tree()
+            self.unwatch_process()
             self.process = None
             logger.info("Process terminated.")
 
+    def kill_process_tree(self):
+        """Force-stops the bot and every child it spawned"""
+        try:
+            # Optional: only this fallback needs psutil, so the guardian still runs without it
+            import psutil
+        except ImportError:
+            logger.warning("psutil not installed; force-killing the bot without a process-tree scan")
+            self.kill_process()
+            return
+        try:
+            parent = psutil.Process(self.process.pid)
+            procs = [parent] + parent.children(recursive=True)
+            for proc in procs:
+                try:
+                    proc.terminate()
+                except psutil.NoSuchProcess:
+                    pass
+            _, alive = psutil.wait_procs(procs, timeout=5)
+            for proc in alive:
+                try:
+                    proc.kill()
+                except psutil.NoSuchProcess:
+                    pass
+        except psutil.NoSuchProcess:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to stop bot cleanly: {e}")
+            self.kill_process()
+
+    def kill_process(self):
+        """Kills the bot (its whole process group on POSIX), ignoring a process that is already gone"""
+        try:
+            if sys.platform == "win32":
+                self.process.kill()
+            else:
+                os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
     def check_health(self):
         """Checks if the bot API is responsive and healthy"""
         try:
-            response = requests.get(API_URL, timeout=10)
+            response = SESSION.get(self.api_url, timeout=HEALTH_TIMEOUT)
             if response.status_code == 200:
-                data = response.json()
-                is_running = data.get("is_running", True) # Headless returns this
+                match = IS_RUNNING_PATTERN.search(response.content)
+                is_running = match is None or match.group(1) == b"true" # Headless returns this
                 
                 if is_running:
                     logger.info("Health Check: PASS (Bot is active)")
                 else:
                     logger.info(f"Health Check: PASS (Bot is IDLE/PAUSED)")
                 
+                # Bot reports whether its market loop is still completing passes
+                match = DATA_FRESH_PATTERN.search(response.content)
+                if match is None or match.group(1) == b"true":
+                    self.last_success_time = time.monotonic()
+                else:
+                    logger.warning("Health Check: API OK but market loop is stale")
+                
                 self.failed_checks = 0
-                self.last_success_time = time.time()
                 return True
             else:
                 logger.error(f"Health Check: FAIL (Status Code {response.status_code})")
@@ -112,36 +248,108 @@ class BotGuardian:
         self.failed_checks += 1
         return False
 
+    def watch_process(self):
+        """Registers the bot's pidfd once, so every later wait is a single epoll_wait"""
+        self.unwatch_process()
+        if self.selector is None:
+            return
+        try:
+            self.pidfd = os.pidfd_open(self.process.pid)
+        except OSError:
+            # Already gone, or kernel without pidfd support: wait_for_exit falls back to Popen.wait
+            return
+        self.selector.register(self.pidfd, selectors.EVENT_READ)
+
+    def unwatch_process(self):
+        """Releases the pidfd of the previous bot process"""
+        if self.pidfd is not None:
+            self.selector.unregister(self.pidfd)
+            os.close(self.pidfd)
+            self.pidfd = None
+
+    def wait_for_exit(self, timeout):
+        """Sleeps up to `timeout` seconds, waking immediately if the bot process exits"""
+        if not self.process:
+            time.sleep(timeout)
+            return False
+        if self.pidfd is not None:
+            # Linux: the pidfd becomes readable the instant the child exits
+            return bool(self.selector.select(timeout))
+        # Windows: Popen.wait blocks on the process handle instead of polling
+        try:
+            self.process.wait(timeout=timeout)
+            return True
+        except subprocess.TimeoutExpired:
+            return False
+
+    def restart_backoff(self):
+        """Delays the restart after repeated early deaths so a crash loop can't hammer Supabase"""
+        if time.monotonic() - self.spawned_at < EARLY_DEATH_WINDOW:
+            self.early_deaths += 1
+        else:
+            self.early_deaths = 0
+        if self.early_deaths:
+            delay = min(MAX_RESTART_DELAY, 2 ** self.early_deaths)
+            logger.warning(f"Bot died {self.early_deaths}x shortly after start. Waiting {delay}s before restart...")
+            time.sleep(delay)
+
+    def wait_ready(self, timeout=READY_TIMEOUT):
+        """Polls the status API after a (re)start and returns as soon as it answers"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if SESSION.get(self.api_url, timeout=1).ok:
+                    logger.info("Bot API is up.")
+                    return True
+            except requests.RequestException:
+                pass
+            # Stop waiting early if the bot dies during boot
+            if self.wait_for_exit(READY_POLL_INTERVAL):
+                return False
+        logger.warning(f"Bot API not ready after {timeout}s.")
+        return False
+
     def run(self):
         """Main Watchdog Loop"""
         logger.info("Guardian Watchdog Started. Monitoring Volatile Trader 24/7...")
         self.start_bot()
-        time.sleep(60) # Increased wait for bot to initialize and sync cloud
+        self.wait_ready() # Wait for bot to initialize and sync cloud
 
         while self.is_running:
             try:
                 # Check if process is still alive at OS level
                 if self.process and self.process.poll() is not None:
                     logger.error("BOT PROCESS DIED UNEXPECTEDLY!")
+                    self.restart_backoff()
                     self.start_bot()
-                    time.sleep(30) 
+                    self.wait_ready()
                 
-                # Check API Health
-                if not self.check_health():
+                # Check API Health (back off while healthy, tighten on failure)
+                if self.check_health():
+                    self.interval = min(self.interval * CHECK_BACKOFF, MAX_CHECK_INTERVAL)
+                    self.early_deaths = 0
+                    # API answers but the internal loop is wedged
+                    if time.monotonic() - self.last_success_time > STALE_DATA_THRESHOLD:
+                        logger.critical("BOT DATA STALE. PERFORMING EMERGENCY RESTART...")
+                        self.start_bot()
+                        self.wait_ready()
+                else:
+                    self.interval = MIN_CHECK_INTERVAL
                     if self.failed_checks >= MAX_TIMEOUTS:
                         logger.critical("BOT UNRESPONSIVE. PERFORMING EMERGENCY RESTART...")
                         self.start_bot()
-                        time.sleep(60)
+                        self.wait_ready()
                 
-                time.sleep(CHECK_INTERVAL)
+                self.wait_for_exit(self.interval)
             except KeyboardInterrupt:
                 logger.info("👋 Watchdog shutting down...")
                 self.is_running = False
                 self.stop_bot()
+                log_buffer.flush()
             except Exception as e:
                 logger.error(f"Unexpected Guardian Error: {e}")
                 time.sleep(10)
 
 if __name__ == "__main__":
-    guardian = BotGuardian()
+    guardian = Guardian()
     guardian.run()
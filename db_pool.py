@@ -0,0 +1,131 @@
+import queue
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+# Pool sizing shared by every DB script (Cryptum 7.1)
+MIN_CONN = 1
+MAX_CONN = 8
+CONNECT_TIMEOUT = 5  # seconds
+
+# TCP keepalives so a dead link to Supabase is noticed in ~60s instead of hanging
+KEEPALIVE_KWARGS = {
+    "keepalives": 1,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 3,
+}
+
+DNS_TTL = 300  # seconds
+PROBE_STATEMENT_TIMEOUT = 500  # ms
+
+_dns_cache = {}
+_pools = {}
+_pools_lock = threading.Lock()
+_closed = False
+
+
+def resolve(host, ttl=DNS_TTL):
+    """Returns a cached IPv4 address for host, or None if it only resolves otherwise"""
+    now = time.monotonic()
+    cached = _dns_cache.get(host)
+    if cached and cached[1] > now:
+        return cached[0]
+    try:
+        ip = socket.getaddrinfo(host, None, socket.AF_INET)[0][4][0]
+    except socket.gaierror:
+        # e.g. IPv6-only direct hosts: let libpq do its own lookup
+        return None
+    _dns_cache[host] = (ip, now + ttl)
+    return ip
+
+
+def get_pool(host, port, **connect_kwargs):
+    """Returns the shared pool for (host, port), opening it on first use"""
+    key = (host, str(port))
+    with _pools_lock:
+        if _closed:
+            raise PoolError("connection pools already closed")
+        pool = _pools.get(key)
+    if pool is not None:
+        return pool
+
+    # Connect outside the lock so parallel probes of different hosts don't serialize
+    connect_kwargs.setdefault("connect_timeout", CONNECT_TIMEOUT)
+    for name, value in KEEPALIVE_KWARGS.items():
+        connect_kwargs.setdefault(name, value)
+    if "hostaddr" not in connect_kwargs:
+        # hostaddr skips libpq's resolver; host is still sent for TLS/SNI
+        ip = resolve(host)
+        if ip:
+            connect_kwargs["hostaddr"] = ip
+    pool = ThreadedConnectionPool(MIN_CONN, MAX_CONN, host=host, port=port, **connect_kwargs)
+    with _pools_lock:
+        # A probe that finishes after close_all() must not leave an open pool behind
+        existing = None if _closed else _pools.setdefault(key, pool)
+    if existing is not pool:
+        pool.closeall()
+    if existing is None:
+        raise PoolError("connection pools already closed")
+    return existing
+
+
+@contextmanager
+def connection(host, port, **connect_kwargs):
+    """Borrows a pooled connection and hands it back when the block exits"""
+    pool = get_pool(host, port, **connect_kwargs)
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        # Broken connections are discarded instead of being reused
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def check_host(host, port, **connect_kwargs):
+    """Returns True if the host accepts a connection and answers a query within the probe timeout"""
+    try:
+        with connection(host, port, **connect_kwargs) as conn:
+            with conn.cursor() as cur:
+                # SET LOCAL keeps the short timeout out of the pooled session
+                cur.execute(f"SET LOCAL statement_timeout = {PROBE_STATEMENT_TIMEOUT}; SELECT 1")
+                cur.fetchone()
+            conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def probe_hosts(candidates, **connect_kwargs):
+    """Probes every (host, port) candidate in parallel and returns the first that answers, or None"""
+    # Daemon threads: a slow losing probe must not keep the script alive until its connect_timeout
+    results = queue.Queue()
+
+    def probe(host, port):
+        ok = False
+        try:
+            ok = check_host(host, port, **connect_kwargs)
+        finally:
+            results.put(((host, port), ok))
+
+    for host, port in candidates:
+        threading.Thread(target=probe, args=(host, port), daemon=True).start()
+    for _ in candidates:
+        candidate, ok = results.get()
+        if ok:
+            return candidate
+    return None
+
+
+def close_all():
+    """Closes every pooled connection (call once at script exit)"""
+    global _closed
+    with _pools_lock:
+        _closed = True
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
@@ -1,46 +1,114 @@
-import psycopg2
 import sys
 import os
+import shutil
+import subprocess
+from functools import lru_cache
+
+from psycopg2 import errors
+
+try:
+    import sqlparse
+except ImportError:
+    sqlparse = None
+
+from db_pool import connection, close_all, probe_hosts
 
 # Configurações do Banco de Dados Cryptum 7.1 (Usando Pooler Host para AWS US-WEST-1)
 # O Host padrão db.ref.supabase.co está falhando no DNS
 DB_HOST = "db.cdudskuxvsexgyxtmtur.supabase.co"
 DB_NAME = "postgres"
 DB_USER = "postgres.cdudskuxvsexgyxtmtur"
-DB_PASS = "&N&6ifTN5uy5krX"
+DB_PASS = os.environ.get("SUPABASE_DB_PASS")
 DB_PORT = "5432"
 
+# Candidatos testados em paralelo: host direto e Pooler (AWS US-WEST-1)
+DB_HOSTS = [
+    (DB_HOST, DB_PORT),
+    ("aws-0-us-west-1.pooler.supabase.com", DB_PORT),
+]
+DB_CONNECT_KWARGS = {
+    "database": DB_NAME,
+    "user": DB_USER,
+    "password": DB_PASS,
+    "connect_timeout": 20,
+}
+VALID_HOST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "VALID_DB_HOST.txt")
+
 SQL_FILE = r"c:\cryptum7.1_bot\SETUP_TABLES_CRYPTUM.sql"
 
+# Erros que indicam que o comando já foi aplicado numa execução anterior
+ALREADY_APPLIED = (errors.DuplicateObject, errors.DuplicateTable, errors.DuplicateFunction)
+
+@lru_cache(maxsize=None)
+def load_statements(path=SQL_FILE):
+    """Lê e divide o script SQL uma única vez por processo"""
+    with open(path, 'r', encoding='utf-8') as f:
+        sql = f.read()
+    if sqlparse is None:
+        return (sql,)
+    return tuple(s for s in sqlparse.split(sql) if s.strip())
+
+def run_psql(host, port):
+    """Aplica o script com o psql (suporta blocos COPY); retorna False se indisponível ou com erro"""
+    psql = shutil.which("psql")
+    if psql is None:
+        return False
+    # Senha via ambiente: não aparece na lista de processos nem quebra com caracteres especiais
+    env = dict(os.environ, PGPASSWORD=DB_PASS, PGCONNECT_TIMEOUT=str(DB_CONNECT_KWARGS["connect_timeout"]))
+    print(f"🚀 Executando {SQL_FILE} via psql...")
+    result = subprocess.run(
+        [psql, "-h", host, "-p", str(port), "-U", DB_USER, "-d", DB_NAME,
+         "-f", SQL_FILE, "-v", "ON_ERROR_STOP=1", "-q"],
+        env=env
+    )
+    if result.returncode != 0:
+        print("⚠️ psql falhou, tentando novamente via psycopg2...")
+        return False
+    return True
+
 def run_sql():
+    if not DB_PASS:
+        print("❌ Defina a variável de ambiente SUPABASE_DB_PASS com a senha do banco.")
+        sys.exit(1)
     try:
-        print(f"🔗 Conectando ao Banco Supabase via Pooler (Região AWS): {DB_HOST}...")
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASS,
-            port=DB_PORT,
-            connect_timeout=20
-        )
-        conn.autocommit = True
-        cur = conn.cursor()
-        
-        print(f"📖 Lendo SQL de: {SQL_FILE}")
-        with open(SQL_FILE, 'r', encoding='utf-8') as f:
-            sql = f.read()
+        print(f"🔎 Testando {len(DB_HOSTS)} hosts do Supabase em paralelo...")
+        winner = probe_hosts(DB_HOSTS, **DB_CONNECT_KWARGS)
+        if winner is None:
+            raise RuntimeError("Nenhum host do Supabase respondeu")
+        host, port = winner
+        with open(VALID_HOST_FILE, 'w', encoding='utf-8') as f:
+            f.write(f"{host}:{port}\n")
+
+        if run_psql(host, port):
+            print("✅ Banco de dados Cryptum inicializado com sucesso! (via psql)")
+            return
+
+        print(f"🔗 Conectando ao Banco Supabase: {host}:{port}...")
+        with connection(host, port, **DB_CONNECT_KWARGS) as conn:
+            conn.autocommit = True
+            
+            print(f"📖 Lendo SQL de: {SQL_FILE}")
+            statements = load_statements()
+                
+            print(f"🚀 Executando inicialização de tabelas ({len(statements)} comandos)...")
+            skipped = 0
+            with conn.cursor() as cur:
+                for statement in statements:
+                    try:
+                        cur.execute(statement)
+                    except ALREADY_APPLIED:
+                        # Sem sqlparse o script é um bloco único: o erro interrompeu o resto
+                        if sqlparse is None:
+                            raise
+                        skipped += 1
             
-        print("🚀 Executando inicialização de tabelas...")
-        cur.execute(sql)
-        
-        print("✅ Banco de dados Cryptum inicializado com sucesso!")
-        
-        cur.close()
-        conn.close()
+            print(f"✅ Banco de dados Cryptum inicializado com sucesso! ({skipped} já existiam)")
     except Exception as e:
         print(f"❌ Erro ao inicializar banco: {e}")
         print("\n💡 Possível causa: Senha incorreta ou host de região diferente.")
         sys.exit(1)
+    finally:
+        close_all()
 
 if __name__ == "__main__":
     run_sql()
@@ -41,10 +41,13 @@ async function startHeadlessBot() {
 
     // 2. Health Check Server (para o Guardian/Watchdog)
     const HEALTH_PORT = 8001;
+    const STALE_TICK_MS = 60000; // Loop de mercado sem completar uma passada há 1 min = travado
     const healthServer = http.createServer((req, res) => {
         if (req.url === '/api/status') {
+            const isRunning = tradingService.getIsRunning();
             const stats = {
-                is_running: tradingService.getIsRunning(),
+                is_running: isRunning,
+                data_fresh: !isRunning || Date.now() - tradingService.getLastTickAt() < STALE_TICK_MS,
                 connected_to_blockchain: true, // Binance API connection check conceptually
                 last_heartbeat: new Date().toISOString()
             };
@@ -56,6 +59,9 @@ async function startHeadlessBot() {
         }
     });
 
+    // Mantém o socket keep-alive do Guardian entre checks (intervalo máximo dele: 300s)
+    healthServer.keepAliveTimeout = 310000;
+
     healthServer.on('error', (err: any) => {
         if (err.code === 'EADDRINUSE') {
             console.warn(`⚠️ Health check port ${HEALTH_PORT} busy. Monitoring will continue without local health check.`);
@@ -45,6 +45,7 @@ class TradingService {
   private currentAdaptiveParams: AdaptiveRiskParams | null = null; // Parâmetros adaptativos atuais
   private lastLossStreak: number = 0; // Loss streak anterior (para detectar mudanças)
   private lastAnalysisLogTime: number = 0; // Timestamp do último log de análise geral
+  private lastTickAt: number = 0; // Timestamp da última passada do loop de mercado (Guardian)
 
   // FASE 3: Zona de recompra rápida
   private lastProfitableSells: Map<string, { price: number; time: number }> = new Map();
@@ -63,6 +64,7 @@ class TradingService {
 
     this.config = config;
     this.isRunning = true;
+    this.lastTickAt = Date.now();
 
     console.log("Starting multi-pair automated trading...", config);
 
@@ -97,6 +99,10 @@ class TradingService {
     return this.isRunning;
   }
 
+  public getLastTickAt(): number {
+    return this.lastTickAt;
+  }
+
   /**
    * Updates trading parameters at runtime (from AI or Remote)
    */
@@ -208,6 +214,7 @@ class TradingService {
       } catch (error) {
         console.error("Error in initial market analysis:", error);
       }
+      this.lastTickAt = Date.now();
     })();
 
     this.monitoringInterval = setInterval(async () => {
@@ -218,6 +225,7 @@ class TradingService {
       } catch (error) {
         console.error("Error in market monitoring:", error);
       }
+      this.lastTickAt = Date.now();
     }, this.PRICE_CHECK_INTERVAL);
   }
 